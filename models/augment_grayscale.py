@@ -1,6 +1,7 @@
 import os
+from multiprocessing import Pool
 from pathlib import Path
-from PIL import Image
+import cv2
 from tqdm import tqdm
 
 # 使用脚本所在目录作为基准，避免绝对路径在不同机器/账号失效
@@ -8,11 +9,22 @@ BASE = Path(__file__).resolve().parent
 SRC_DIR = BASE / 'elevatorSigns-3' / 'train' / 'images'
 DST_DIR = SRC_DIR.parent / 'images_gray'
 
-DST_DIR.mkdir(parents=True, exist_ok=True)
 
-for fname in tqdm(os.listdir(SRC_DIR)):
-    if fname.lower().endswith(('.jpg', '.jpeg', '.png')):
-        img = Image.open(SRC_DIR / fname).convert('L')  # 转灰度
-        img.save(DST_DIR / fname)
+def convert_one(fname: str) -> None:
+    # OpenCV 直接解码为灰度（libjpeg-turbo），省去 PIL 的 RGB 解码 + convert
+    gray = cv2.imread(str(SRC_DIR / fname), cv2.IMREAD_GRAYSCALE)
+    if gray is not None:
+        cv2.imwrite(str(DST_DIR / fname), gray)
 
-print(f'已批量生成灰度图片到 {DST_DIR}')
+
+if __name__ == '__main__':
+    DST_DIR.mkdir(parents=True, exist_ok=True)
+
+    with os.scandir(SRC_DIR) as it:
+        files = [e.name for e in it if e.is_file() and e.name.lower().endswith(('.jpg', '.jpeg', '.png'))]
+
+    # 多进程并行转换（每个 CPU 核心一个进程）
+    with Pool() as pool:
+        list(tqdm(pool.imap_unordered(convert_one, files), total=len(files)))
+
+    print(f'已批量生成灰度图片到 {DST_DIR}')
@@ -2,13 +2,29 @@ from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 from ultralytics import YOLO
-from PIL import Image, ImageDraw
-import base64
+from PIL import Image
+import asyncio
+import importlib.util
 import io
 import os
+import re
+import shutil
+import threading
 import uvicorn
 import cv2
 import numpy as np
+import torch
+import torch.nn.functional as F
+from functools import lru_cache
+from torchvision.io import ImageReadMode, decode_jpeg
+from torchvision.ops import batched_nms
+from typing import Optional
+
+try:
+    # SIMD-accelerated drop-in replacement for the stdlib codec (same b64decode/b64encode API)
+    import pybase64 as base64
+except ImportError:
+    import base64
 
 
 class DetectReq(BaseModel):
@@ -24,24 +40,372 @@ app.add_middleware(
     allow_methods=["*"], allow_headers=["*"],
 )
 
-import os
 # Explicitly load COCO and custom model from fixed paths
 COCO_MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "yolov8n.pt")
 CUSTOM_MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "runs", "detect", "elevator_sign_yolov8n", "weights", "best.pt")
 
-try:
-    coco_model = YOLO(COCO_MODEL_PATH)
-except Exception as e:
-    raise RuntimeError(f"Failed to load COCO model from {COCO_MODEL_PATH}: {e}")
-try:
-    custom_model = YOLO(CUSTOM_MODEL_PATH)
-except Exception as e:
-    raise RuntimeError(f"Failed to load custom model from {CUSTOM_MODEL_PATH}: {e}")
+USE_CUDA = torch.cuda.is_available()
+DEVICE = 0 if USE_CUDA else "cpu"
+
+# The .pt weights are exported once to an optimized runtime (set EXPORT_ENGINE=0 to disable);
+# skipped, with the .pt used as-is, when the backend package is not installed:
+# - CUDA hosts: TensorRT engine, INT8 when a calibration dataset yaml exists at
+#   models/calib/<weights stem>.yaml, else FP16.
+# - CPU-only hosts: OpenVINO IR, INT8-calibrated on the model's own dataset, else FP32.
+EXPORT_ENGINE = os.environ.get("EXPORT_ENGINE", "1") == "1"
+ENGINE_CACHE_DIR = os.path.join(os.path.dirname(__file__), "engine_cache")
+CALIB_DIR = os.path.join(os.path.dirname(__file__), "calib")
+ENGINE_IMGSZ = 640
+ENGINE_BATCH = 8
+
+
+def runtime_version(module: str) -> str:
+    # Engines/IR are not portable across runtime releases; openvino's version contains '/'
+    try:
+        return re.sub(r"[^\w.]+", "_", importlib.import_module(module).__version__)
+    except Exception:
+        # Still caught by the load check in load_exported() if the runtime is broken
+        return "unknown"
+
+
+def engine_cache_path(weights_path: str, precision: str, suffix: str) -> str:
+    """Export cached by weights mtime + hardware + runtime version, so retraining, a different GPU
+    or a TensorRT/OpenVINO upgrade rebuilds it."""
+    stem = os.path.splitext(os.path.basename(weights_path))[0]
+    mtime = int(os.path.getmtime(weights_path))
+    hardware = torch.cuda.get_device_name(0).replace(" ", "_") if USE_CUDA else "cpu"
+    runtime = f"trt{runtime_version('tensorrt')}" if USE_CUDA else f"ov{runtime_version('openvino')}"
+    # Ultralytics picks the runtime from the suffix (".engine", "_openvino_model")
+    return os.path.join(ENGINE_CACHE_DIR, f"{stem}-{mtime}-{hardware}-{runtime}-{precision}{suffix}")
+
+
+def has_modules(*names: str) -> bool:
+    # Ultralytics' exporter pip-installs missing backends on the fly; only export when they are already installed
+    return all(importlib.util.find_spec(name) is not None for name in names)
+
+
+# Intermediate files the exporters leave next to the weights (ONNX graph, TensorRT INT8 calibration cache)
+EXPORT_INTERMEDIATE_SUFFIXES = (".onnx", ".cache")
+
+
+def export_cached(weights_path: str, precision: str, suffix: str, **export_kwargs) -> Optional[str]:
+    cached_path = engine_cache_path(weights_path, precision, suffix)
+    if not os.path.exists(cached_path):
+        base = os.path.splitext(weights_path)[0]
+        intermediates = [base + ext for ext in EXPORT_INTERMEDIATE_SUFFIXES if not os.path.exists(base + ext)]
+        try:
+            exported = YOLO(weights_path).export(**export_kwargs)
+            os.makedirs(ENGINE_CACHE_DIR, exist_ok=True)
+            shutil.move(exported, cached_path)
+        except Exception as e:
+            print(f"[infer] {export_kwargs['format']} {precision} export failed for {weights_path}: {e}", flush=True)
+            return None
+        finally:
+            # Only remove what this export created
+            for path in intermediates:
+                if os.path.exists(path):
+                    os.remove(path)
+    return cached_path
+
+
+def load_exported(path: Optional[str]) -> Optional[YOLO]:
+    """Load an exported model and run one dummy predict; None if the artifact cannot be loaded or run."""
+    if not path:
+        return None
+    try:
+        model = YOLO(path, task="detect")
+        model.predict(np.zeros((ENGINE_IMGSZ, ENGINE_IMGSZ, 3), dtype=np.uint8), imgsz=ENGINE_IMGSZ,
+                      verbose=False, device=DEVICE)
+        return model
+    except Exception as e:
+        print(f"[infer] cached export {path} is unusable, falling back: {e}", flush=True)
+        return None
+
+
+def load_model(weights_path: str, openvino_data: Optional[str] = None) -> YOLO:
+    if not EXPORT_ENGINE or not has_modules("tensorrt" if USE_CUDA else "openvino"):
+        return YOLO(weights_path)
+
+    model = None
+    if USE_CUDA:
+        stem = os.path.splitext(os.path.basename(weights_path))[0]
+        calib_data = os.path.join(CALIB_DIR, f"{stem}.yaml")
+        common = dict(format="engine", imgsz=ENGINE_IMGSZ, dynamic=True, batch=ENGINE_BATCH, device=0)
+        if os.path.isfile(calib_data):
+            model = load_exported(
+                export_cached(weights_path, "int8", ".engine", int8=True, data=calib_data, workspace=4, **common)
+            )
+        if model is None:
+            model = load_exported(export_cached(weights_path, "fp16", ".engine", half=True, **common))
+    else:
+        common = dict(format="openvino", imgsz=ENGINE_IMGSZ, dynamic=True, batch=ENGINE_BATCH)
+        # INT8 quantization additionally needs nncf
+        if openvino_data and has_modules("nncf"):
+            model = load_exported(
+                export_cached(weights_path, "int8", "_openvino_model", int8=True, data=openvino_data, **common)
+            )
+        if model is None:
+            model = load_exported(export_cached(weights_path, "fp32", "_openvino_model", **common))
+    # Export failed or the cached artifact cannot run: fall back to the PyTorch weights
+    return model if model is not None else YOLO(weights_path)
+
+
+# YOLOv8n is dozens of tiny kernels, so small batches are launch-bound. With CUDA_GRAPHS=1 the
+# PyTorch forward of each preloaded model is captured at startup for every batch size and replayed.
+# TensorRT engines are left alone.
+CUDA_GRAPHS = USE_CUDA and os.environ.get("CUDA_GRAPHS", "0") == "1"
+
+
+class CudaGraphForward:
+    """Replacement for a module's forward that replays CUDA graphs captured up front, one per input shape."""
+
+    def __init__(self, module: torch.nn.Module, warmup_iters: int = 3):
+        self.forward = module.forward
+        self.warmup_iters = warmup_iters
+        self.graphs = {}
+
+    @torch.inference_mode()
+    def capture(self, x: torch.Tensor) -> None:
+        static_input = x.clone()
+        # Warm up on a side stream so cuDNN/allocator state is settled before capture
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(stream):
+            for _ in range(self.warmup_iters):
+                self.forward(static_input)
+        torch.cuda.current_stream().wait_stream(stream)
+        graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(graph):
+            static_output = self.forward(static_input)
+        self.graphs[(tuple(x.shape), x.dtype)] = (graph, static_input, static_output)
+
+    @torch.inference_mode()
+    def __call__(self, x: torch.Tensor, *args, **kwargs):
+        entry = self.graphs.get((tuple(x.shape), x.dtype))
+        if entry is None:
+            # Never capture on the request path: the other model may be launching kernels concurrently
+            return self.forward(x, *args, **kwargs)
+        graph, static_input, static_output = entry
+        static_input.copy_(x, non_blocking=True)
+        graph.replay()
+        # Outputs are overwritten by the next replay; the predictor post-processes them before that
+        return static_output
+
+
+def enable_cuda_graphs(model: YOLO) -> None:
+    """Capture one graph per batch size 1..MAX_BATCH; call serially, before any request is served."""
+    # The predictor (and its AutoBackend) only exists after the first predict call
+    model.predict(np.zeros((ENGINE_IMGSZ, ENGINE_IMGSZ, 3), dtype=np.uint8), verbose=False, device=DEVICE)
+    backend = model.predictor.model
+    if not getattr(backend, "pt", False):
+        return
+    graphed = CudaGraphForward(backend.model)
+    dtype = torch.float16 if getattr(backend, "fp16", False) else torch.float32
+    for batch in range(1, MAX_BATCH + 1):
+        graphed.capture(torch.zeros((batch, 3, ENGINE_IMGSZ, ENGINE_IMGSZ), dtype=dtype, device="cuda"))
+    backend.model.forward = graphed
+
+
+MODEL_PATHS = {"coco": COCO_MODEL_PATH, "custom": CUSTOM_MODEL_PATH}
+# Datasets used to calibrate the OpenVINO INT8 export on CPU hosts
+OPENVINO_CALIB_DATA = {
+    "coco": "coco128.yaml",
+    "custom": os.path.join(os.path.dirname(__file__), "elevatorSigns-3", "data.yaml"),
+}
+
+# Models load on first use; list the ones to load at startup, e.g. MODELS_PRELOAD=custom
+# for an elevator-only deployment so the COCO model never occupies GPU memory.
+MODELS_PRELOAD = [k.strip() for k in os.environ.get("MODELS_PRELOAD", "coco,custom").split(",") if k.strip()]
+
+
+_models = {}
+# Lazy loads run in worker threads; the lock keeps two first requests from exporting the same model twice
+_models_lock = threading.Lock()
+
+
+def get_model(kind: str) -> YOLO:
+    model = _models.get(kind)
+    if model is not None:
+        return model
+    with _models_lock:
+        if kind not in _models:
+            path = MODEL_PATHS[kind]
+            try:
+                _models[kind] = load_model(path, openvino_data=OPENVINO_CALIB_DATA.get(kind))
+            except Exception as e:
+                raise RuntimeError(f"Failed to load {kind} model from {path}: {e}")
+        return _models[kind]
+
+
+@lru_cache(maxsize=None)
+def get_labels(kind: str) -> dict:
+    """Lowercased label -> class id, used to skip inference for targets the model cannot detect."""
+    return {name.lower(): cls_id for cls_id, name in get_model(kind).names.items()}
+
 
 # Per-model default confidence thresholds (can be overridden via env)
 COCO_CONF_THRESH = float(os.environ.get("COCO_CONF_THRESH", "0.25"))
 CUSTOM_CONF_THRESH = float(os.environ.get("CUSTOM_CONF_THRESH", "0.25"))
 
+# Micro-batching: concurrent requests for the same model are coalesced into one predict call
+MAX_BATCH = int(os.environ.get("MAX_BATCH", str(ENGINE_BATCH)))
+MAX_LATENCY_MS = float(os.environ.get("MAX_LATENCY_MS", "5"))
+
+# Decode JPEG uploads on the GPU with nvjpeg (set NVJPEG=0 to always decode with PIL)
+NVJPEG = USE_CUDA and os.environ.get("NVJPEG", "1") == "1"
+NMS_DEVICE = "cuda" if USE_CUDA else "cpu"
+
+
+class BatchQueue:
+    """Queue of pending images for one model, drained by a background worker in batches."""
+
+    def __init__(self, model: YOLO):
+        self.model = model
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._worker())
+
+    async def predict(self, img, conf: float, cls_id: Optional[int] = None):
+        fut = asyncio.get_running_loop().create_future()
+        await self.queue.put((img, conf, cls_id, fut))
+        return await fut
+
+    async def _next_batch(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + MAX_LATENCY_MS / 1000.0
+        while len(batch) < MAX_BATCH:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self, items: list, source) -> None:
+        # Run at the lowest requested conf; each request re-filters with its own threshold
+        min_conf = min(conf for _, conf, _, _ in items)
+        # Only keep the classes some request in the batch asked for
+        cls_ids = {cls_id for _, _, cls_id, _ in items}
+        classes = None if None in cls_ids else sorted(cls_ids)
+        try:
+            # predict is blocking, keep it off the event loop
+            results = await asyncio.to_thread(
+                self.model.predict, source, imgsz=ENGINE_IMGSZ, verbose=False, conf=min_conf,
+                classes=classes, device=DEVICE,
+            )
+        except Exception as e:
+            for *_, fut in items:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (*_, fut), result in zip(items, results):
+            if not fut.done():
+                fut.set_result(result)
+
+    async def _worker(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                # GPU-decoded tensors stack into one BCHW batch; host arrays go as a list
+                tensors = [item for item in batch if isinstance(item[0], torch.Tensor)]
+                images = [item for item in batch if not isinstance(item[0], torch.Tensor)]
+                if tensors:
+                    await self._run(tensors, torch.cat([item[0] for item in tensors]))
+                if images:
+                    await self._run(images, [item[0] for item in images])
+            except Exception as e:
+                # Fail this batch's requests but keep the worker alive; otherwise every later
+                # request for this model would wait on its future forever
+                for *_, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+
+
+# Separate queues so elevator (custom) and COCO requests batch independently
+batch_queues = {}
+
+
+def get_batch_queue(kind: str) -> BatchQueue:
+    q = batch_queues.get(kind)
+    if q is None:
+        q = batch_queues[kind] = BatchQueue(get_model(kind))
+        q.start()
+    return q
+
+
+def decode_jpeg_cuda(img_bytes: bytes) -> Optional[torch.Tensor]:
+    """Decode a JPEG straight into a CUDA uint8 CHW tensor with nvjpeg; None if not a JPEG or no GPU."""
+    if not (NVJPEG and img_bytes[:2] == b"\xff\xd8"):
+        return None
+    try:
+        data = torch.frombuffer(bytearray(img_bytes), dtype=torch.uint8)
+        return decode_jpeg(data, mode=ImageReadMode.RGB, device="cuda")
+    except Exception:
+        return None
+
+
+def letterbox_params(img_w: int, img_h: int):
+    """(scale, new_w, new_h, pad_x, pad_y) to fit the image into ENGINE_IMGSZ keeping its aspect ratio."""
+    r = min(ENGINE_IMGSZ / img_w, ENGINE_IMGSZ / img_h)
+    new_w, new_h = round(img_w * r), round(img_h * r)
+    return r, new_w, new_h, (ENGINE_IMGSZ - new_w) // 2, (ENGINE_IMGSZ - new_h) // 2
+
+
+def to_model_input(img_chw: torch.Tensor) -> torch.Tensor:
+    # Ultralytics does not letterbox tensor inputs: it expects BCHW float in [0, 1] with stride-aligned dims,
+    # so letterbox here the way training did (centered, gray 114 padding)
+    _, img_h, img_w = img_chw.shape
+    _, new_w, new_h, pad_x, pad_y = letterbox_params(img_w, img_h)
+    x = img_chw.unsqueeze(0).float().div_(255.0)
+    x = F.interpolate(x, size=(new_h, new_w), mode="bilinear", align_corners=False)
+    out = x.new_full((1, 3, ENGINE_IMGSZ, ENGINE_IMGSZ), 114 / 255.0)
+    out[:, :, pad_y:pad_y + new_h, pad_x:pad_x + new_w] = x
+    return out
+
+
+def resize_for_model(arr_rgb: np.ndarray) -> np.ndarray:
+    # Ultralytics reads ndarrays as BGR; a pre-letterboxed square input makes its own letterbox a no-op
+    img_h, img_w = arr_rgb.shape[:2]
+    _, new_w, new_h, pad_x, pad_y = letterbox_params(img_w, img_h)
+    arr = cv2.resize(arr_rgb, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    arr = cv2.copyMakeBorder(arr, pad_y, ENGINE_IMGSZ - new_h - pad_y, pad_x, ENGINE_IMGSZ - new_w - pad_x,
+                             cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return cv2.cvtColor(arr, cv2.COLOR_RGB2BGR)
+
+
+def decode_image(image_b64: str):
+    """Returns (img_gpu, arr, model_input, width, height); exactly one of img_gpu / arr is set."""
+    img_bytes = base64.b64decode(image_b64)
+    img_gpu = decode_jpeg_cuda(img_bytes)
+    # Both paths letterbox to ENGINE_IMGSZ once here; boxes are mapped back to the original size in extract()
+    if img_gpu is not None:
+        img_h, img_w = img_gpu.shape[1:]
+        return img_gpu, None, to_model_input(img_gpu), img_w, img_h
+    # PNG (or no GPU) falls back to PIL; only probe the formats the frontend sends
+    img = Image.open(io.BytesIO(img_bytes), formats=["JPEG", "PNG"])
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    # Single writable RGB array, reused for the model input and for drawing the preview
+    arr = np.array(img)
+    img_h, img_w = arr.shape[:2]
+    return None, arr, resize_for_model(arr), img_w, img_h
+
+
+@app.on_event("startup")
+async def preload_models():
+    for kind in MODELS_PRELOAD:
+        if CUDA_GRAPHS:
+            # Serial, before serving: a capture must never overlap another model's predict.
+            # Models loaded lazily later run the eager forward.
+            enable_cuda_graphs(get_model(kind))
+        get_batch_queue(kind)
+
 
 @app.get("/health")
 def health():
@@ -49,17 +413,35 @@ def health():
 
 
 @app.post("/detect")
-def detect(req: DetectReq):
+async def detect(req: DetectReq):
+    target_lower = req.target.lower().strip()
+    model_kind = "custom" if target_lower == "elevator" else "coco"
+    try:
+        # First use may export/load the model (minutes for TensorRT); keep it off the event loop
+        await asyncio.to_thread(get_model, model_kind)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"{model_kind} model unavailable: {e}")
+    if target_lower not in get_labels(model_kind):
+        # The model serving this target has no such class, so inference cannot find it
+        return {
+            "found": False,
+            "detections": [],
+            "preview_b64": None,
+            "backend_version": "with_preview"
+        }
+
     try:
-        img_bytes = base64.b64decode(req.image_b64)
-        img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
+        # base64 + image decode are CPU-bound; run them in a thread so the event loop keeps serving
+        img_gpu, arr, model_input, img_w, img_h = await asyncio.to_thread(decode_image, req.image_b64)
+        scale, _, _, pad_x, pad_y = letterbox_params(img_w, img_h)
     except Exception:
         raise HTTPException(status_code=400, detail="invalid image_b64")
 
     # (debug image saving removed)
 
     req_conf = float(req.threshold)
-    target_lower = req.target.lower().strip()
+    # Batches predict the union of their requests' classes, so each request re-filters to its own
+    target_cls = get_labels(model_kind)[target_lower]
 
     results_coco = None
     results_custom = None
@@ -68,7 +450,7 @@ def detect(req: DetectReq):
     if target_lower != "elevator":
         coco_conf = max(req_conf, COCO_CONF_THRESH)
         try:
-            results_coco = coco_model.predict(img, verbose=False, conf=coco_conf)[0]
+            results_coco = await get_batch_queue("coco").predict(model_input, coco_conf, target_cls)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"coco infer failed: {e}")
     
@@ -76,27 +458,29 @@ def detect(req: DetectReq):
     if target_lower == "elevator":
         custom_conf = max(req_conf, CUSTOM_CONF_THRESH)
         try:
-            results_custom = custom_model.predict(img, verbose=False, conf=custom_conf)[0]
+            results_custom = await get_batch_queue("custom").predict(model_input, custom_conf, target_cls)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"custom model infer failed: {e}")
 
     def extract(results):
-        out = []
         if results is None:
-            return out
+            return []
         names = results.names
         boxes = getattr(results, "boxes", None)
         if boxes is None or len(boxes) == 0:
-            return out
-        for i in range(len(boxes)):
-            try:
-                cls_id = int(boxes.cls[i].item())
-                conf = float(boxes.conf[i].item())
-                x1, y1, x2, y2 = map(float, boxes.xyxy[i].tolist())
-                label = names.get(cls_id, str(cls_id))
-                out.append({"label": label, "conf": conf, "box": [x1, y1, x2, y2]})
-            except Exception:
-                continue
+            return []
+        # One device->host copy per field instead of an .item() sync per box
+        cls = boxes.cls.cpu().numpy().astype(np.int32)
+        # Drop boxes of other requests' classes that shared this micro-batch
+        mine = cls == target_cls
+        cls = cls[mine]
+        conf = boxes.conf.cpu().numpy()[mine]
+        # Undo the letterbox: remove the padding, then the single scale factor
+        xyxy = (boxes.xyxy.cpu().numpy()[mine] - np.array([pad_x, pad_y, pad_x, pad_y], dtype=np.float32)) / scale
+        xyxy = xyxy.clip(0, [img_w, img_h, img_w, img_h])
+        out = []
+        for i in range(len(cls)):
+            out.append({"label": names.get(int(cls[i]), str(cls[i])), "conf": float(conf[i]), "box": xyxy[i].tolist()})
         return out
 
     # Extract detections from the appropriate model based on target
@@ -110,57 +494,41 @@ def detect(req: DetectReq):
     threshold = max(req_conf, CUSTOM_CONF_THRESH if target_lower == "elevator" else COCO_CONF_THRESH)
     filtered_dets = [d for d in detections if d.get("conf", 0.0) >= threshold]
     dets = filtered_dets
+    # Lowercased once, in a side list so the public detections keep their documented fields
+    dets_lc = [d["label"].lower() for d in dets]
 
     # simple duplicate suppression: keep highest-confidence detection for same label with IoU > 0.5
-    def iou(boxA, boxB):
-        xA = max(boxA[0], boxB[0])
-        yA = max(boxA[1], boxB[1])
-        xB = min(boxA[2], boxB[2])
-        yB = min(boxA[3], boxB[3])
-        interW = max(0.0, xB - xA)
-        interH = max(0.0, yB - yA)
-        interArea = interW * interH
-        boxAArea = max(0.0, boxA[2] - boxA[0]) * max(0.0, boxA[3] - boxA[1])
-        boxBArea = max(0.0, boxB[2] - boxB[0]) * max(0.0, boxB[3] - boxB[1])
-        denom = boxAArea + boxBArea - interArea
-        if denom <= 0:
-            return 0.0
-        return interArea / denom
-
-    dets.sort(key=lambda x: x.get("conf", 0.0), reverse=True)
-    kept = []
+    keep_idx = []
     iou_thresh = 0.5
-    for d in dets:
-        box = d["box"]
-        label = d["label"].lower()
-        dup = False
-        for k in kept:
-            if k["label"].lower() == label and iou(k["box"], box) > iou_thresh:
-                dup = True
-                break
-        if not dup:
-            kept.append(d)
+    if dets:
+        label_ids = {}
+        boxes = torch.tensor([d["box"] for d in dets], dtype=torch.float32, device=NMS_DEVICE)
+        scores = torch.tensor([d["conf"] for d in dets], dtype=torch.float32, device=NMS_DEVICE)
+        labels = torch.tensor(
+            [label_ids.setdefault(lc, len(label_ids)) for lc in dets_lc], device=NMS_DEVICE
+        )
+        keep_idx = batched_nms(boxes, scores, labels, iou_thresh).tolist()
 
-    detections = kept
-    found = any(det["label"].lower() == req.target.lower() for det in detections)
+    detections = [dets[i] for i in keep_idx]
+    found = any(dets_lc[i] == target_lower for i in keep_idx)
 
     # 生成带框预览图片
-    preview_img = img.copy()
-    draw = ImageDraw.Draw(preview_img)
+    if arr is None:
+        # GPU-decoded: only now copy the pixels back to the host for drawing
+        arr = img_gpu.permute(1, 2, 0).contiguous().cpu().numpy()
+    # 直接在解码后的数组上画框（RGB），不再复制整张图
     for det in detections:
-        box = det["box"]
-        label = det["label"]
-        conf = det["conf"]
-        x1, y1, x2, y2 = box
+        x1, y1, x2, y2 = map(int, det["box"])
         # 画框
-        draw.rectangle([x1, y1, x2, y2], outline="red", width=3)
+        cv2.rectangle(arr, (x1, y1), (x2, y2), (255, 0, 0), 3)
         # 画标签
-        draw.text((x1, y1 - 12), f"{label} {conf:.2f}", fill="red")
-    # 转 PNG base64
+        cv2.putText(arr, f"{det['label']} {det['conf']:.2f}", (x1, y1 - 4), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1)
+    # 转 JPEG base64（比 PNG 编码快得多、体积更小）
     print("[detect] returning preview_b64", flush=True)
-    buf = io.BytesIO()
-    preview_img.save(buf, format="PNG")
-    preview_b64 = base64.b64encode(buf.getvalue()).decode()
+    ok, buf = cv2.imencode(".jpg", cv2.cvtColor(arr, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 80])
+    if not ok:
+        raise HTTPException(status_code=500, detail="preview encode failed")
+    preview_b64 = base64.b64encode(buf).decode()
     return {
         "found": found,
         "detections": detections,
@@ -172,4 +540,6 @@ def detect(req: DetectReq):
 if __name__ == "__main__":
     host = os.environ.get("HOST", "0.0.0.0")
     port = int(os.environ.get("PORT", "8000"))
-    uvicorn.run("infer_server:app", host=host, port=port, reload=False)
+    # Each worker is a separate process with its own models and batch queues
+    workers = int(os.environ.get("WORKERS", "1"))
+    uvicorn.run("infer_server:app", host=host, port=port, reload=False, workers=workers)
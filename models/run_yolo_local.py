@@ -2,10 +2,10 @@ import argparse
 import os
 import time
 import platform
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional, Tuple
 
 from ultralytics import YOLO
-from PIL import Image
 import cv2
 import numpy as np
 import signal
@@ -29,9 +29,10 @@ def draw_boxes(img_bgr: np.ndarray, detections: List[dict]) -> np.ndarray:
     return img_bgr
 
 
-def infer_on_pil(model: YOLO, pil_img: Image.Image, target: str, threshold: float) -> Tuple[bool, List[dict]]:
-    # Use Ultralytics predict API; pass conf to reduce post-filter work
-    results = model.predict(pil_img, verbose=False, conf=threshold)[0]
+def infer_on_frame(model: YOLO, frame_bgr: np.ndarray, target: str, threshold: float) -> Tuple[bool, List[dict]]:
+    # Use Ultralytics predict API; pass conf to reduce post-filter work.
+    # BGR ndarrays are Ultralytics' native input, so no RGB/PIL conversion is needed.
+    results = model.predict(frame_bgr, verbose=False, conf=threshold)[0]
     detections, found = [], False
     names = results.names
     boxes = getattr(results, "boxes", None)
@@ -46,27 +47,44 @@ def infer_on_pil(model: YOLO, pil_img: Image.Image, target: str, threshold: floa
                 found = True
     return found, detections
 
-def infer_on_pil_dual(pil_img: Image.Image, target: str, threshold: float, model_coco: YOLO, model_custom: YOLO) -> Tuple[bool, List[dict]]:
-    # 先用 COCO 模型
-    found_coco, det_coco = infer_on_pil(model_coco, pil_img, target, threshold)
-    # 再用自定义模型
-    found_custom, det_custom = infer_on_pil(model_custom, pil_img, target, threshold)
+
+# 自定义模型在后台线程推理，与 COCO 模型重叠（torch 计算期间会释放 GIL）
+_CUSTOM_POOL = ThreadPoolExecutor(max_workers=1)
+
+
+def infer_on_frame_dual(
+    frame_bgr: np.ndarray,
+    target: str,
+    threshold: float,
+    model_coco: YOLO,
+    model_custom: YOLO,
+    run_custom: bool = True,
+    last_custom: Tuple[bool, List[dict]] = (False, []),
+) -> Tuple[bool, List[dict], Tuple[bool, List[dict]]]:
+    """Returns (found, detections, custom_result); pass custom_result back as last_custom next frame."""
+    # 两个模型同时推理，总耗时约为 max(T_coco, T_custom)
+    # run_custom=False 时跳过自定义模型，复用 last_custom
+    fut_custom = _CUSTOM_POOL.submit(infer_on_frame, model_custom, frame_bgr, target, threshold) if run_custom else None
+    found_coco, det_coco = infer_on_frame(model_coco, frame_bgr, target, threshold)
+    custom = fut_custom.result() if fut_custom is not None else last_custom
     # 合并结果
-    found = found_coco or found_custom
-    detections = det_coco + det_custom
-    return found, detections
+    found = found_coco or custom[0]
+    detections = det_coco + custom[1]
+    return found, detections, custom
 
 
 def run_image(image_path: str, target: str, threshold: float, save_path: Optional[str]):
-    pil_img = Image.open(image_path).convert("RGB")
+    # cv2.imread 直接解码为 BGR（libjpeg-turbo），推理和保存都复用这一份数组
+    img_bgr = cv2.imread(image_path)
+    if img_bgr is None:
+        raise RuntimeError(f"Cannot read image {image_path}")
     # 加载两个模型
     model_coco = YOLO(os.path.join(os.path.dirname(__file__), "..", "yolov8n.pt"))
     model_custom = YOLO(os.path.join(os.path.dirname(__file__), "..", "runs", "detect", "elevator_sign_yolov8n", "weights", "best.pt"))
-    found, detections = infer_on_pil_dual(pil_img, target, threshold, model_coco, model_custom)
+    found, detections, _ = infer_on_frame_dual(img_bgr, target, threshold, model_coco, model_custom)
     print({"found": found, "detections": detections})
     if save_path:
         # draw and save
-        img_bgr = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
         img_bgr = draw_boxes(img_bgr, detections)
         cv2.imwrite(save_path, img_bgr)
         print(f"annotated saved to {save_path}")
@@ -117,6 +135,7 @@ def run_webcam(
     no_display: bool = False,
     max_seconds: float = 0.0,
     max_frames: int = 0,
+    custom_every: int = 3,
 ):
     # Auto-scan when cam_index == -1
     if cam_index == -1:
@@ -136,6 +155,9 @@ def run_webcam(
     start_time = time.time()
     frame_count = 0
     window_name = "YOLOv8 Local"
+    # 电梯标志不会快速移动：自定义模型每 custom_every 帧跑一次，其余帧复用上次结果
+    custom_every = max(1, custom_every)
+    last_custom: Tuple[bool, List[dict]] = (False, [])
 
     # Setup signal handlers to allow Ctrl+C exits
     try:
@@ -163,8 +185,11 @@ def run_webcam(
             if not ok:
                 break
             frame_count += 1
-            pil_img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-            found, detections = infer_on_pil_dual(pil_img, target, threshold, model_coco, model_custom)
+            # 直接把 BGR 帧交给 YOLO，省去 cvtColor + PIL 两次整帧拷贝
+            found, detections, last_custom = infer_on_frame_dual(
+                frame, target, threshold, model_coco, model_custom,
+                run_custom=(frame_count - 1) % custom_every == 0, last_custom=last_custom,
+            )
             if not no_display:
                 vis = draw_boxes(frame.copy(), detections)
                 if found:
@@ -210,6 +235,7 @@ def main():
     parser.add_argument("--no-display", action="store_true", help="Do not open any window; only print logs")
     parser.add_argument("--max-seconds", type=float, default=0.0, help="Auto-quit after N seconds (0 = no limit)")
     parser.add_argument("--max-frames", type=int, default=0, help="Auto-quit after N frames (0 = no limit)")
+    parser.add_argument("--custom-every", type=int, default=3, help="Webcam: run the elevator model every N frames, reusing its last result in between (1 = every frame)")
     args = parser.parse_args()
 
     if args.image:
@@ -222,6 +248,7 @@ def main():
             no_display=args.no_display,
             max_seconds=args.max_seconds,
             max_frames=args.max_frames,
+            custom_every=args.custom_every,
         )
 
 
@@ -15,16 +15,53 @@ Usage:
     # Customizations
     python setup_environment.py --requirements models/requirements.txt --venv .venv --model yolov8n.pt
 """
-import argparse
+import hashlib
+import json
 import os
 import platform
+import re
 import shutil
 import subprocess
 import sys
+import tempfile
+import threading
 from pathlib import Path
-from typing import Optional, List
+from types import SimpleNamespace
+from typing import Optional, List, Tuple
 
-EXCLUDE_DIRS = {".git", ".hg", ".svn", ".venv", "venv", "env", "__pycache__", ".mypy_cache", ".pytest_cache"}
+# Oldest pip we keep without upgrading (parallel-friendly resolver + --dry-run support)
+MIN_PIP_VERSION = (23, 1)
+
+NPM_FLAGS = ["--prefer-offline", "--no-audit", "--no-fund", "--progress=false"]
+
+# sys.platform is fixed at interpreter build time; no platform.system() probing needed
+IS_WINDOWS = sys.platform.startswith("win")
+
+YOLO_ASSETS_URL = "https://github.com/ultralytics/assets/releases/download/v8.3.0"
+
+WARMUP_TEMPLATE = """\
+import os
+import numpy as np
+import torch
+from ultralytics import YOLO
+
+torch.set_num_threads(os.cpu_count() or 1)
+try:
+    torch.backends.cudnn.benchmark = True
+except Exception:
+    pass
+device = "cuda" if torch.cuda.is_available() else "cpu"
+img = np.zeros((640, 640, 3), dtype=np.uint8)
+for name in {models!r}:
+    model = YOLO(name)
+    # cuDNN autotune 在第二次 forward 才选定 kernel，多跑几次让真实首帧不再冷启动
+    for _ in range(3):
+        model.predict(img, imgsz=640, verbose=False, conf=0.25, device=device)
+    print(f"YOLO warmup complete: {{name}}")
+"""
+
+EXCLUDE_DIRS = {".git", ".hg", ".svn", ".venv", "venv", "env", "__pycache__", ".mypy_cache", ".pytest_cache",
+                "node_modules", "dist", "build"}
 
 def log(msg: str) -> None:
     print(f"[setup] {msg}")
@@ -32,25 +69,114 @@ def log(msg: str) -> None:
 def error(msg: str) -> None:
     print(f"[setup][error] {msg}", file=sys.stderr)
 
+class Proc:
+    """A started command whose merged stdout/stderr is streamed line by line to our stdout."""
+
+    def __init__(self, cmd: List[str], env: Optional[dict] = None, cwd: Optional[Path] = None):
+        self.popen = subprocess.Popen(
+            cmd, env=env, cwd=str(cwd) if cwd else None,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            bufsize=1, text=True, errors="replace",
+        )
+        # Pump in a thread so concurrent commands (pip + npm) both stream without blocking each other
+        self.pump = threading.Thread(target=self._forward, daemon=True)
+        self.pump.start()
+
+    def _forward(self) -> None:
+        for line in self.popen.stdout:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+
+    def wait(self) -> int:
+        rc = self.popen.wait()
+        self.pump.join()
+        return rc
+
+def run_async(cmd: List[str], env: Optional[dict] = None, cwd: Optional[Path] = None) -> Proc:
+    """Start cmd without waiting; the caller collects the exit code with .wait()."""
+    return Proc(cmd, env=env, cwd=cwd)
+
 def run(cmd: List[str], env: Optional[dict] = None, cwd: Optional[Path] = None) -> None:
-    subprocess.run(cmd, check=True, env=env, cwd=str(cwd) if cwd else None)
+    rc = run_async(cmd, env=env, cwd=cwd).wait()
+    if rc != 0:
+        raise subprocess.CalledProcessError(rc, cmd)
+
+def pip_install_cmd(vpy: Path, use_uv: bool) -> List[str]:
+    """Base install command for the venv: uv's parallel native installer when available, else pip."""
+    if use_uv:
+        return ["uv", "pip", "install", "--python", str(vpy)]
+    # --no-compile skips .pyc generation at install time; modules are compiled on first import anyway
+    # (uv does not compile by default). The PIP_NO_COMPILE env var would be read inverted by pip.
+    return [str(vpy), "-m", "pip", "install", "--prefer-binary", "--no-compile"]
+
+def venv_pip_version(vpy: Path) -> Optional[Tuple[int, ...]]:
+    """(major, minor) of the venv's pip, read via pip.__version__ to avoid pip's CLI startup."""
+    try:
+        out = subprocess.run(
+            [str(vpy), "-c", "import pip; print(pip.__version__)"],
+            check=True, capture_output=True, text=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    parts = re.findall(r"\d+", out)[:2]
+    return tuple(int(p) for p in parts) if parts else None
+
+def requirements_satisfied(vpy: Path, req_path: Path, env: dict) -> bool:
+    """True if `pip install --dry-run --report -` (pip >= 22.2) has nothing to install."""
+    try:
+        dry = subprocess.run(
+            [str(vpy), "-m", "pip", "install", "--dry-run", "--quiet", "--report", "-", "-r", str(req_path)],
+            env=env, capture_output=True, text=True,
+        )
+        report = json.loads(dry.stdout) if dry.returncode == 0 else None
+    except (OSError, ValueError):
+        return False
+    # Older pip rejects --dry-run/--report; any failure just falls through to the real install
+    return isinstance(report, dict) and report.get("install") == []
+
+def has_command(name: str) -> bool:
+    return shutil.which(name) is not None
 
 def venv_python_path(venv_dir: Path) -> Path:
-    if platform.system().lower().startswith("win"):
+    if IS_WINDOWS:
         return venv_dir / "Scripts" / "python.exe"
     return venv_dir / "bin" / "python"
 
-def create_venv(venv_dir: Path, base_python: str) -> Path:
-    if not venv_dir.exists():
+def has_virtualenv(base_python: str) -> bool:
+    rc = subprocess.run([base_python, "-c", "import virtualenv"],
+                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+    return rc == 0
+
+def create_venv(venv_dir: Path, base_python: str, use_uv: bool = False) -> Path:
+    """Create venv_dir if missing, using the fastest available tool:
+
+    1. ``uv venv`` (when use_uv): no in-venv pip, uv installs from outside.
+    2. PyPA ``virtualenv`` if importable from base_python: seeds pip/setuptools from its
+       app-data wheel cache (~/.local/share/virtualenv) instead of running ensurepip.
+    3. stdlib ``python -m venv``.
+    """
+    existed = venv_dir.exists()
+    if not existed and use_uv:
+        # uv creates the venv in milliseconds and installs into it from outside (no in-venv pip)
+        log(f"Creating virtual environment at {venv_dir} with uv")
+        run(["uv", "venv", str(venv_dir), "--python", base_python])
+    elif not existed and has_virtualenv(base_python):
+        log(f"Creating virtual environment at {venv_dir} with virtualenv")
+        run([base_python, "-m", "virtualenv", "--no-download", str(venv_dir)])
+    elif not existed:
         log(f"Creating virtual environment at {venv_dir}")
         run([base_python, "-m", "venv", str(venv_dir)])
     else:
-        log(f"Using existing virtual environment at {venv_dir}")
+        log(f"Using existing virtual environment at {venv_dir.resolve()}")
     vpy = venv_python_path(venv_dir)
     if not vpy.exists():
         # In rare cases, ensurepip might be needed
         log("Ensuring pip is available in the virtual environment")
         run([base_python, "-m", "venv", str(venv_dir), "--upgrade-deps"])
+    elif existed and not use_uv and venv_pip_version(vpy) is None:
+        # e.g. a venv made by `uv venv` (no pip) reused with --no-uv or after uv left PATH
+        log("Bootstrapping pip into the virtual environment")
+        run([str(vpy), "-m", "ensurepip", "--upgrade"])
     return venv_python_path(venv_dir)
 
 def find_requirements(start: Path) -> Optional[Path]:
@@ -64,31 +190,115 @@ def find_requirements(start: Path) -> Optional[Path]:
     if root_req.is_file():
         return root_req
 
-    # Recursive search excluding common virtual env and VCS dirs
-    for path in start.rglob("requirements.txt"):
-        parts = set(p.name for p in path.parents)
-        if EXCLUDE_DIRS.isdisjoint(parts):
-            return path
+    # Walk top-down, pruning virtual env, VCS and vendored dirs in place before descending into them
+    for root, dirs, files in os.walk(start, topdown=True):
+        dirs[:] = [d for d in dirs if d not in EXCLUDE_DIRS]
+        if "requirements.txt" in files:
+            return Path(root) / "requirements.txt"
     return None
 
+def prefetch_yolo_weights(models: List[str], dest_dir: Path) -> None:
+    for model in models:
+        prefetch_one_weight(model, dest_dir)
+
+def prefetch_one_weight(model: str, dest_dir: Path) -> None:
+    """Best-effort download of official Ultralytics weights (e.g. yolov8n.pt) into dest_dir.
+
+    Runs alongside the dependency install so the warmup finds the file on disk instead of
+    downloading it serially afterwards. Local paths and already-present files are left alone;
+    on any failure the warmup simply downloads the weights itself.
+    """
+    model_path = Path(model)
+    dest = dest_dir / model_path.name
+    if model_path.parent != Path(".") or model_path.suffix != ".pt" or dest.exists():
+        return
+    part = dest.with_name(dest.name + ".part")
+    try:
+        # Imported here: urllib.request alone costs more startup time than the rest of the imports
+        import urllib.request
+        log(f"Prefetching {model_path.name} in the background")
+        urllib.request.urlretrieve(f"{YOLO_ASSETS_URL}/{model_path.name}", str(part))
+        os.replace(part, dest)
+    except Exception as e:
+        log(f"Weight prefetch failed ({e}); warmup will download them instead")
+        try:
+            part.unlink()
+        except OSError:
+            pass
+
+def requirements_stamp(req_path: Path) -> str:
+    return hashlib.sha256(req_path.read_bytes()).hexdigest()
+
 def ensure_python_version(min_major: int = 3, min_minor: int = 10) -> None:
     if sys.version_info < (min_major, min_minor):
         error(f"Python {min_major}.{min_minor}+ is required. Detected {platform.python_version()}.")
         sys.exit(1)
 
+# (flag, kind, default, help) -- kind is "flag" (store_true), "path", "str" or "list" (one or
+# more values, repeatable). A tiny table-driven parser instead of argparse keeps interpreter
+# startup minimal on the common re-run path, where the install is skipped entirely.
+OPTIONS = [
+    ("--venv", "path", Path(".venv"), "Virtual environment directory (default: .venv)"),
+    ("--python", "str", sys.executable, "Base Python executable to create the venv (default: current Python)"),
+    ("--requirements", "path", None, "Path to requirements.txt (auto-detect if omitted)"),
+    ("--no-upgrade", "flag", False, "Skip upgrading pip/setuptools/wheel"),
+    ("--no-uv", "flag", False, "Create the venv and install with venv/pip even if uv is on PATH"),
+    ("--force", "flag", False, "Reinstall dependencies even if requirements.txt is unchanged"),
+    ("--cache-dir", "path", None, "Package download/wheel cache directory (default: .pip-cache in project root)"),
+    ("--with-node", "flag", False, "Install Node.js backend dependencies if backend/package.json exists"),
+    ("--warmup", "flag", False, "Warm up YOLO model to pre-download weights and JIT caches"),
+    ("--model", "list", None, "Model name(s) or path(s) to warm up; repeatable (default: yolov8n.pt)"),
+    ("--backend-dir", "path", Path("backend"), "Backend directory containing package.json (default: backend)"),
+]
+
+def print_help() -> None:
+    print("usage: setup_environment.py [options]\n\nSet up project environment and install dependencies.\n\noptions:")
+    print(f"  {'-h, --help':<22} show this help message and exit")
+    for flag, kind, _, help_text in OPTIONS:
+        name = flag if kind == "flag" else f"{flag} {'PATH' if kind == 'path' else 'VALUE'}"
+        print(f"  {name:<22} {help_text}")
+
+def parse_args(argv: List[str]) -> SimpleNamespace:
+    spec = {flag: kind for flag, kind, _, _ in OPTIONS}
+    values = {flag: default for flag, _, default, _ in OPTIONS}
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        i += 1
+        if arg in ("-h", "--help"):
+            print_help()
+            sys.exit(0)
+        flag, eq, inline = arg.partition("=")
+        kind = spec.get(flag)
+        if kind is None:
+            error(f"unrecognized argument: {arg} (see --help)")
+            sys.exit(2)
+        if kind == "flag":
+            if eq:
+                error(f"{flag} does not take a value")
+                sys.exit(2)
+            values[flag] = True
+            continue
+        items = [inline] if eq else []
+        while i < len(argv) and not argv[i].startswith("-") and (kind == "list" or not items):
+            items.append(argv[i])
+            i += 1
+        if not items:
+            error(f"{flag} expects a value")
+            sys.exit(2)
+        if kind == "list":
+            values[flag] = (values[flag] or []) + items
+        else:
+            values[flag] = Path(items[0]) if kind == "path" else items[0]
+    args = SimpleNamespace(**{flag.lstrip("-").replace("-", "_"): v for flag, v in values.items()})
+    if not args.model:
+        args.model = ["yolov8n.pt"]
+    return args
+
 def main() -> None:
     ensure_python_version()
 
-    parser = argparse.ArgumentParser(description="Set up project environment and install dependencies.")
-    parser.add_argument("--venv", type=Path, default=Path(".venv"), help="Virtual environment directory (default: .venv)")
-    parser.add_argument("--python", default=sys.executable, help="Base Python executable to create the venv (default: current Python)")
-    parser.add_argument("--requirements", type=Path, help="Path to requirements.txt (auto-detect if omitted)")
-    parser.add_argument("--no-upgrade", action="store_true", help="Skip upgrading pip/setuptools/wheel")
-    parser.add_argument("--with-node", action="store_true", help="Install Node.js backend dependencies if backend/package.json exists")
-    parser.add_argument("--warmup", action="store_true", help="Warm up YOLO model to pre-download weights and JIT caches")
-    parser.add_argument("--model", default="yolov8n.pt", help="Model name or path to warm up (default: yolov8n.pt)")
-    parser.add_argument("--backend-dir", type=Path, default=Path("backend"), help="Backend directory containing package.json (default: backend)")
-    args = parser.parse_args()
+    args = parse_args(sys.argv[1:])
 
     project_root = Path.cwd()
     req_path = args.requirements if args.requirements else find_requirements(project_root)
@@ -99,76 +309,123 @@ def main() -> None:
     log(f"Project root: {project_root}")
     log(f"Using requirements file: {req_path}")
 
+    use_uv = not args.no_uv and has_command("uv")
+    if use_uv:
+        log("Using uv for venv creation and package installation (pass --no-uv to use venv/pip)")
+
     # Create venv and get its python
-    venv_dir = args.venv.resolve()
-    vpy = create_venv(venv_dir, args.python)
+    # absolute() 不走 symlink 解析，避免在网络盘/WSL 挂载上逐级 stat
+    venv_dir = (args.venv if args.venv.is_absolute() else project_root / args.venv).absolute()
+    venv_existed = venv_dir.exists()
+    vpy = create_venv(venv_dir, args.python, use_uv)
 
     # Prepare environment for pip to reduce noise
     env = os.environ.copy()
     env.setdefault("PIP_DISABLE_PIP_VERSION_CHECK", "1")
+    env.setdefault("PIP_NO_INPUT", "1")
     env.setdefault("PYTHONUTF8", "1")
+    # Project-local wheel cache survives venv re-creation (and ephemeral ~/.cache in CI containers)
+    if args.cache_dir:
+        env["PIP_CACHE_DIR"] = str(args.cache_dir.absolute())
+    else:
+        env.setdefault("PIP_CACHE_DIR", str(project_root / ".pip-cache"))
+    env.setdefault("UV_CACHE_DIR", str(Path(env["PIP_CACHE_DIR"]) / "uv"))
+    Path(env["PIP_CACHE_DIR"]).mkdir(parents=True, exist_ok=True)
 
-    # Ensure pip present and updated
-    try:
-        if not args.no_upgrade:
-            log("Upgrading pip, setuptools, and wheel in the virtual environment")
-            run([str(vpy), "-m", "pip", "install", "--upgrade", "pip", "setuptools", "wheel"], env=env)
+    # Locate backend deps first so the Node preflight runs before anything is spawned
+    backend_dir = None
+    if args.with_node:
+        backend_dir = (project_root / args.backend_dir).absolute()
+        if (backend_dir / "package.json").is_file():
+            # Check node/npm availability (a PATH lookup, no subprocess needed)
+            log("Detected backend/package.json. Checking Node.js...")
+            if not (has_command("node") and has_command("npm")):
+                error("Node.js or npm not found. Install Node 18+ from https://nodejs.org/ and re-run with --with-node.")
+                sys.exit(5)
         else:
-            log("Skipping upgrade of pip/setuptools/wheel as requested")
-    except subprocess.CalledProcessError:
-        error("Failed to upgrade pip/setuptools/wheel.")
-        sys.exit(3)
+            log(f"--with-node specified, but {backend_dir}/package.json not found. Skipping Node setup.")
+            backend_dir = None
 
-    # Install requirements
-    try:
-        log("Installing project dependencies")
-        run([str(vpy), "-m", "pip", "install", "-r", str(req_path)], env=env)
-    except subprocess.CalledProcessError:
-        error("Failed to install dependencies from requirements.txt.")
-        sys.exit(4)
+    # Download warmup weights in the background while dependencies install
+    prefetch = None
+    if args.warmup:
+        prefetch = threading.Thread(target=prefetch_yolo_weights, args=(args.model, project_root), daemon=True)
+        prefetch.start()
 
-    # Optionally install Node.js backend deps
-    if args.with_node:
-        backend_dir = (project_root / args.backend_dir).resolve()
-        pkg = backend_dir / "package.json"
-        if pkg.is_file():
+    # Skip the install entirely when requirements.txt is unchanged since the last successful run
+    stamp_file = venv_dir / ".setup_hash"
+    stamp = requirements_stamp(req_path)
+    pip_proc = None
+    if not args.force and stamp_file.is_file() and stamp_file.read_text() == stamp:
+        log("Dependencies unchanged since last successful setup, skipping install (use --force to reinstall)")
+    elif venv_existed and not use_uv and not args.force and requirements_satisfied(vpy, req_path, env):
+        # Stamp missing/stale but the existing venv already has everything: skip the full resolver walk.
+        # The stamp is only ever written after a real install succeeded.
+        log("Dependencies already satisfied, skipping install")
+    else:
+        pip_cmd = pip_install_cmd(vpy, use_uv)
+        if use_uv:
+            # uv installs from outside the venv, so the in-venv pip tooling needs no upgrade
+            log("Installing project dependencies")
+        elif args.no_upgrade:
+            log("Installing project dependencies (skipping upgrade of pip/setuptools/wheel as requested)")
+        elif (venv_pip_version(vpy) or (0,)) >= MIN_PIP_VERSION:
+            # Fresh venvs (and --upgrade-deps) already ship a recent pip
+            log("Installing project dependencies (pip is recent, skipping pip/setuptools/wheel upgrade)")
+        else:
+            # Separate run: --upgrade applies to every requirement on the command line, so folding it
+            # into the -r install would also upgrade torch/ultralytics/... already in the venv
+            log("Upgrading pip, setuptools, and wheel")
             try:
-                # Check node/npm availability
-                log("Detected backend/package.json. Checking Node.js...")
-                try:
-                    subprocess.run(["node", "-v"], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                    subprocess.run(["npm", "-v"], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                except Exception:
-                    error("Node.js or npm not found. Install Node 18+ from https://nodejs.org/ and re-run with --with-node.")
-                    raise
-
-                # Prefer npm ci when lockfile present
-                if (backend_dir / "package-lock.json").is_file():
-                    log("Installing backend deps with 'npm ci'")
-                    run(["npm", "ci"], cwd=backend_dir)
-                else:
-                    log("Installing backend deps with 'npm install'")
-                    run(["npm", "install"], cwd=backend_dir)
-                log("Backend dependencies installed")
+                run(pip_install_cmd(vpy, use_uv) + ["--upgrade", "pip", "setuptools", "wheel"], env=env)
             except subprocess.CalledProcessError:
-                error("Failed to install backend Node.js dependencies.")
-                # Non-fatal for Python environment setup
-        else:
-            log(f"--with-node specified, but {backend_dir}/package.json not found. Skipping Node setup.")
+                error("Failed to upgrade pip/setuptools/wheel.")
+                sys.exit(4)
+            log("Installing project dependencies")
+        pip_cmd += ["-r", str(req_path)]
+        # pip (venv) and npm (backend/node_modules) touch disjoint trees and are mostly
+        # network-bound, so run them concurrently: wall time ~ max(pip, npm) instead of the sum.
+        # First try wheels only (no sdist builds for the heavy ML stack); retried below if a wheel is missing
+        pip_proc = run_async(pip_cmd + ["--only-binary=:all:"], env=env)
+    npm_proc = None
+    if backend_dir is not None:
+        # Warm-cache friendly: use cached tarballs first, skip audit/fund round-trips, more sockets
+        env_node = {**os.environ, "npm_config_maxsockets": "50", "npm_config_fund": "false"}
+        # Prefer npm ci when lockfile present
+        npm_cmd = ["npm", "ci"] if (backend_dir / "package-lock.json").is_file() else ["npm", "install"]
+        npm_cmd += NPM_FLAGS
+        log(f"Installing backend deps with '{' '.join(npm_cmd)}' (maxsockets=50)")
+        npm_proc = run_async(npm_cmd, env=env_node, cwd=backend_dir)
+
+    pip_rc = 0
+    if pip_proc is not None:
+        pip_rc = pip_proc.wait()
+        if pip_rc != 0:
+            log("Wheel-only install failed; retrying with source builds allowed")
+            pip_rc = run_async(pip_cmd, env=env).wait()
+    npm_rc = npm_proc.wait() if npm_proc is not None else 0
+    if pip_rc != 0:
+        error("Failed to upgrade pip/setuptools/wheel or install dependencies from requirements.txt.")
+        sys.exit(4)
+    if pip_proc is not None:
+        stamp_file.write_text(stamp)
+    # npm failure is non-fatal for the Python environment: finish warmup/VS Code/hints, exit 5 at the end
+    if npm_rc != 0:
+        error("Failed to install backend Node.js dependencies.")
+    elif npm_proc is not None:
+        log("Backend dependencies installed")
 
     # Optional YOLO warmup to pre-download weights and reduce first-run latency
     if args.warmup:
+        if prefetch is not None:
+            prefetch.join()
+        warmup_script = project_root / ".setup_warmup.py"
         try:
-            log("Warming up YOLO model (this may take a few minutes on first run)...")
-            # Run a small Python snippet inside the venv to ensure it uses installed libs
-            warmup_code = (
-                "from ultralytics import YOLO;\n"
-                f"model = YOLO(r'{args.model}');\n"
-                "import numpy as np; img = np.zeros((640,640,3), dtype=np.uint8);\n"
-                "model.predict(img, imgsz=640, verbose=False, conf=0.25);\n"
-                "print('YOLO warmup complete')\n"
-            )
-            run([str(vpy), "-c", warmup_code], env=env)
+            log("Warming up YOLO model(s) (this may take a few minutes on first run)...")
+            # One script inside the venv loads every model, so torch/ultralytics are imported only once
+            warmup_script.write_text(WARMUP_TEMPLATE.format(models=list(args.model)), encoding="utf-8")
+            run([str(vpy), str(warmup_script)], env=env)
+            warmup_script.unlink()
         except subprocess.CalledProcessError:
             error("YOLO warmup failed. You can skip with --no-warmup or try again later.")
 
@@ -183,37 +440,47 @@ def main() -> None:
         vscode_dir = project_root / ".vscode"
         vscode_dir.mkdir(exist_ok=True)
         settings_path = vscode_dir / "settings.json"
-        python_setting = {
-            "python.defaultInterpreterPath": interp_path
-        }
-        # Merge if exists
+        # Merge if exists; read the raw bytes once so an unchanged file can be detected exactly
+        raw = settings_path.read_bytes() if settings_path.is_file() else None
         existing = {}
-        if settings_path.is_file():
-            import json
-            with settings_path.open("r", encoding="utf-8") as f:
-                try:
-                    existing = json.load(f) or {}
-                except Exception:
-                    existing = {}
-            existing.update(python_setting)
-            with settings_path.open("w", encoding="utf-8") as f:
-                json.dump(existing, f, indent=4)
+        if raw is not None:
+            try:
+                existing = json.loads(raw) or {}
+            except ValueError:
+                existing = {}
+        new_bytes = None
+        if existing.get("python.defaultInterpreterPath") != interp_path:
+            existing["python.defaultInterpreterPath"] = interp_path
+            new_bytes = json.dumps(existing, indent=4).encode("utf-8")
+        if new_bytes is None or new_bytes == raw:
+            # Nothing changed: no reflow of the user's formatting, no write, no VS Code reload
+            log(f"VS Code interpreter setting already up to date in {settings_path}")
         else:
-            import json
-            with settings_path.open("w", encoding="utf-8") as f:
-                json.dump(python_setting, f, indent=4)
-        log(f"Wrote VS Code interpreter setting to {settings_path}")
+            # Write a temp file and atomically swap it in, so an interrupted run can
+            # never leave a truncated settings.json behind
+            fd, tmp_name = tempfile.mkstemp(dir=vscode_dir, prefix="settings.", suffix=".json.tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(new_bytes)
+                os.replace(tmp_name, settings_path)
+            except BaseException:
+                os.unlink(tmp_name)
+                raise
+            log(f"Wrote VS Code interpreter setting to {settings_path}")
     except Exception as e:
         # Non-fatal
         log(f"Skipping VS Code settings update: {e}")
 
     # Final guidance
-    if platform.system().lower().startswith("win"):
+    if IS_WINDOWS:
         # PowerShell activation script
         activate_hint = f".\\{venv_dir.name}\\Scripts\\Activate.ps1"
     else:
         activate_hint = f"source {venv_dir}/bin/activate"
     log(f"Activate the environment with: {activate_hint}")
+    if npm_rc != 0:
+        error("Python environment is ready, but backend Node.js dependencies failed to install.")
+        sys.exit(5)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file